@@ -0,0 +1,175 @@
+"""
+Benchmarks of the curve estimators on synthetic data (generate_noisy_data), in both
+precisions and split modes, from 64 to 512 voxels per side.
+
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline_curves.json --sizes 64
+    python benchmarks/run_benchmarks.py --save-baseline local.json
+    python benchmarks/run_benchmarks.py --baseline local.json --sizes 64 128
+
+Every case records the best wall time of some repetitions, the peak memory (tracemalloc)
+and its curve. Against a baseline, a case fails if its curve drifts more than the tolerance
+of its precision or, if the baseline has timings, if it is slower than time_tolerance times
+the baseline time. The committed baseline_curves.json only has the curves (64 voxels per
+side, --curves-only), timings are only comparable with a baseline saved on the same machine.
+The SPRS estimators are skipped when the shuffling package is not installed.
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+import numpy as np
+
+from self_fourier_shell_correlation import fsc_utils as fsc
+
+SEED = 0
+SNR = 1/4
+B_SIGNAL = 50
+B_NOISE = 20
+
+# maximum absolute difference of the curves with the baseline
+DRIFT_TOLERANCE = {'double': 1e-10, 'single': 1e-5}
+
+def synthetic_pair(size, d):
+    """Two noisy realizations of the same random (B-factor blurred) signal, size^d voxels"""
+
+    np.random.seed(SEED)
+    v = np.random.normal(0, 1, (size,)*d)
+    y1, eps = fsc.generate_noisy_data(v, 1, SNR, B_signal=B_SIGNAL, B_noise=B_NOISE, return_noise=True)
+    y2 = fsc.generate_noisy_data(v, 1, SNR, B_signal=B_SIGNAL, B_noise=B_NOISE)
+
+    return y1, y2, eps
+
+def _sprs(y1, y2, eps):
+    np.random.seed(SEED)
+    return fsc.get_SFRC_curve__SPRS(y1, N=2)[1]
+
+def _sprs1(y1, y2, eps):
+    np.random.seed(SEED)
+    return fsc.get_SFRC_curve__SPRS1(y1, N=2)[1]
+
+# name: (dimensions, estimator(y1, y2, noise) -> curve)
+CASES = {
+    'single_image_frc/n1': (2, lambda y1, y2, eps: np.mean(fsc.single_image_frc(y1, y1.shape[0]//2), axis=0)),
+    'single_image_frc/n2': (2, lambda y1, y2, eps: np.mean(fsc.single_image_frc(y1, y1.shape[0]//2, n_splits=2), axis=0)),
+    'single_volume_fsc/n1': (3, lambda y1, y2, eps: np.mean(fsc.single_volume_fsc(y1, y1.shape[0]//2), axis=0)),
+    'single_volume_fsc/n3': (3, lambda y1, y2, eps: np.mean(fsc.single_volume_fsc(y1, y1.shape[0]//2, n_splits=3), axis=0)),
+    'get_SFSC_curve': (3, lambda y1, y2, eps: fsc.get_SFSC_curve(y1)[1]),
+    'two_volume_fsc': (3, lambda y1, y2, eps: fsc.two_volume_fsc(y1, y2, y1.shape[0]//2)),
+    'fourier_shell_correlation': (3, lambda y1, y2, eps: fsc.fourier_shell_correlation(y1, y2, 1/y1.shape[0])[1]),
+    # the curve of the whitening is the power spectrum of the whitened data
+    'whitening_transform': (3, lambda y1, y2, eps: fsc.compute_spherically_averaged_power_spectrum(
+        fsc.whitening_transform(y1, eps, y1.shape[0]//2), y1.shape[0]//2)),
+    'get_SFRC_curve__SPRS': (2, _sprs),
+    'get_SFRC_curve__SPRS1': (2, _sprs1),
+}
+
+def run_case(estimator, data, repeat):
+    """Best wall time of repeat runs, peak memory (bytes) of one more traced run, and the curve"""
+
+    seconds = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        estimator(*data)
+        seconds.append(time.perf_counter() - t)
+
+    tracemalloc.start()
+    curve = estimator(*data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return min(seconds), peak, np.asarray(curve, dtype=np.float64)
+
+def run(sizes, precisions, cases, repeat=3):
+    """Run the benchmarks, returns a dict of results keyed by case/precision/size"""
+
+    results = {}
+
+    for precision in precisions:
+        fsc.set_precision(precision)
+        for size in sizes:
+            data = {}
+            for name in cases:
+                d, estimator = CASES[name]
+                key = f"{name}/{precision}/{size}"
+                if d not in data:
+                    data[d] = synthetic_pair(size, d)
+                try:
+                    seconds, peak, curve = run_case(estimator, data[d], repeat)
+                except (ImportError, AttributeError) as e:
+                    if not isinstance(e, ImportError) and not isinstance(e.__cause__, ImportError):
+                        raise
+                    # a lazy name of fsc_utils whose package is missing raises AttributeError
+                    print(f"{key:45s} skipped ({e})")
+                    continue
+                results[key] = {'seconds': seconds, 'peak_bytes': peak, 'curve': curve.tolist()}
+                print(f"{key:45s} {seconds:10.4f} s {peak / 2**20:10.1f} MiB")
+
+    fsc.set_precision('double')
+
+    return results
+
+def compare(results, baseline, time_tolerance=1.25):
+    """
+    Cases whose curves drifted or slower than time_tolerance times the baseline (if it has
+    timings), returns a list of messages
+    """
+
+    failures = []
+
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        reference = baseline[key]
+
+        ratio = result['seconds'] / reference['seconds'] if 'seconds' in reference else 0
+        if ratio > time_tolerance:
+            failures.append(f"{key}: {ratio:.2f}x slower ({reference['seconds']:.4f} s -> {result['seconds']:.4f} s)")
+
+        precision = key.split('/')[-2]
+        curve, reference_curve = np.array(result['curve']), np.array(reference['curve'])
+        if curve.shape != reference_curve.shape:
+            failures.append(f"{key}: curve length {reference_curve.size} -> {curve.size}")
+            continue
+        drift = np.nanmax(np.abs(curve - reference_curve)) if curve.size else 0
+        if drift > DRIFT_TOLERANCE[precision] or not np.array_equal(np.isnan(curve), np.isnan(reference_curve)):
+            failures.append(f"{key}: curve drifted by {drift:.3g}")
+
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the FSC/FRC/SFSC estimators")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 128, 256, 512])
+    parser.add_argument('--precisions', nargs='+', default=['double', 'single'], choices=['double', 'single'])
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=list(CASES), metavar='CASE')
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case (the best is kept)")
+    parser.add_argument('--baseline', help="JSON results to compare with")
+    parser.add_argument('--time-tolerance', type=float, default=1.25)
+    parser.add_argument('--save-baseline', help="write the results to this JSON file")
+    parser.add_argument('--curves-only', action='store_true', help="save only the curves (a baseline to commit)")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.precisions, args.cases, args.repeat)
+
+    if args.save_baseline:
+        saved = results
+        if args.curves_only:
+            saved = {key: {'curve': result['curve']} for key, result in results.items()}
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'platform': platform.platform(), 'numpy': np.__version__, 'results': saved}, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        failures = compare(results, baseline, args.time_tolerance)
+        for failure in failures:
+            print("FAIL", failure)
+        return int(bool(failures))
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
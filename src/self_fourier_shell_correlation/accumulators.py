@@ -0,0 +1,108 @@
+"""
+Streaming FSC: per-shell sums that are updated with new spectra, merged across
+processes and serialized, so the curve can be read at any point without going
+back to the raw data.
+
+    acc = fsc_accumulator(shape, rmax)
+    for Y1, Y2 in spectra:                       # rftn of tiles, subsets, time points...
+        acc = update_fsc_accumulator(acc, Y1, Y2)
+    acc = merge_fsc_accumulators(acc, other)     # e.g. from another process
+    corr = fsc_accumulator_curve(acc)
+
+The curve is the correlation pooled over all the updates, the same as
+compute_fourier_shell_correlation of the concatenation of all the spectra.
+"""
+
+from collections import namedtuple
+import numpy as np
+
+from .core import get_shell_plan, _shell_correlation_sums, _normalize_correlation
+
+# t, b1, b2: per-shell sums of Re(conj(Y1)*Y2), |Y1|**2 and |Y2|**2; counts: voxels per shell
+# summed over the n_updates spectra pairs
+FSCAccumulator = namedtuple('FSCAccumulator', ['shape', 'rmax', 'half', 'shift', 't', 'b1', 'b2', 'counts', 'n_updates'])
+
+def fsc_accumulator(shape, rmax, half=True, shift=None):
+    """
+    Empty accumulator for spectra of real arrays of given shape (rftn half spectra,
+    or centered full spectra with half=False), Y2 phase shifted by shift
+    """
+
+    plan = get_shell_plan(shape, rmax, half=half)
+    zeros = np.zeros(plan.rmax)
+    shift = None if shift is None else tuple(float(s) for s in shift)
+
+    return FSCAccumulator(tuple(int(n) for n in shape), int(rmax), bool(half), shift,
+                          zeros, zeros.copy(), zeros.copy(), zeros.copy(), 0)
+
+def update_fsc_accumulator(acc, Y1, Y2, chunk_size=2**16):
+    """Accumulator with the shell sums of the spectra Y1, Y2 (or stacks (..., *spectrum) of them) added"""
+
+    assert Y1.shape == Y2.shape, "arrays must be same shape"
+
+    plan = get_shell_plan(acc.shape, acc.rmax, half=acc.half)
+    d = len(acc.shape)
+
+    Y1 = np.ascontiguousarray(Y1).reshape(-1, int(np.prod(Y1.shape[Y1.ndim - d:])))
+    Y2 = np.ascontiguousarray(Y2).reshape(Y1.shape)
+
+    t, b1, b2 = _shell_correlation_sums(Y1, Y2, plan, acc.half, acc.shift, chunk_size)
+    n = Y1.shape[0]
+
+    return acc._replace(t=acc.t + t.sum(axis=0), b1=acc.b1 + b1.sum(axis=0), b2=acc.b2 + b2.sum(axis=0),
+                        counts=acc.counts + n * plan.counts, n_updates=acc.n_updates + n)
+
+def merge_fsc_accumulators(*accs):
+    """Sum of accumulators of the same shape, rmax, spectrum type and shift"""
+
+    first = accs[0]
+    for acc in accs[1:]:
+        assert (acc.shape, acc.rmax, acc.half, acc.shift) == (first.shape, first.rmax, first.half, first.shift), \
+            "accumulators of different shells can not be merged"
+
+    return first._replace(t=sum(acc.t for acc in accs), b1=sum(acc.b1 for acc in accs),
+                          b2=sum(acc.b2 for acc in accs), counts=sum(acc.counts for acc in accs),
+                          n_updates=sum(acc.n_updates for acc in accs))
+
+def fsc_accumulator_curve(acc, gamma=1/4, whiten_upsample=False):
+    """Correlation per shell of everything accumulated so far (NaN before the first update)"""
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _normalize_correlation(acc.t, acc.b1, acc.b2, acc.counts, gamma, whiten_upsample)
+
+def fsc_accumulator_to_dict(acc):
+    """JSON serializable state of an accumulator"""
+
+    state = acc._asdict()
+    for k in ('t', 'b1', 'b2', 'counts'):
+        state[k] = state[k].tolist()
+    state['shape'] = list(acc.shape)
+    state['shift'] = None if acc.shift is None else list(acc.shift)
+
+    return state
+
+def fsc_accumulator_from_dict(state):
+    """Accumulator from fsc_accumulator_to_dict"""
+
+    acc = fsc_accumulator(state['shape'], state['rmax'], state['half'], state['shift'])
+
+    return acc._replace(t=np.array(state['t'], dtype=np.float64), b1=np.array(state['b1'], dtype=np.float64),
+                        b2=np.array(state['b2'], dtype=np.float64), counts=np.array(state['counts'], dtype=np.float64),
+                        n_updates=int(state['n_updates']))
+
+def save_fsc_accumulator(file, acc):
+    """Write an accumulator to a .npz file"""
+
+    np.savez(file, shape=np.array(acc.shape), rmax=acc.rmax, half=acc.half,
+             shift=np.array([] if acc.shift is None else acc.shift, dtype=np.float64),
+             t=acc.t, b1=acc.b1, b2=acc.b2, counts=acc.counts, n_updates=acc.n_updates)
+
+def load_fsc_accumulator(file):
+    """Read an accumulator written by save_fsc_accumulator"""
+
+    with np.load(file) as f:
+        shift = f['shift'].tolist() or None
+        state = {'shape': f['shape'].tolist(), 'rmax': int(f['rmax']), 'half': bool(f['half']), 'shift': shift,
+                 't': f['t'], 'b1': f['b1'], 'b2': f['b2'], 'counts': f['counts'], 'n_updates': int(f['n_updates'])}
+
+    return fsc_accumulator_from_dict(state)
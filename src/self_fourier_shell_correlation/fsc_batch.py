@@ -0,0 +1,246 @@
+"""
+Batch computation of FSC/SFSC curves and resolutions over many maps.
+
+    sfsc-batch "maps/*.mrc" -o results.csv --method sfsc --jobs 8
+
+Every finished file is appended to <output>.partial.jsonl, so an interrupted
+run started again with the same output skips the files already done. When all
+the files are done, the columnar output (.csv, or .parquet with pandas) is written.
+"""
+
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from . import fsc_utils as fsc
+
+def load_array(path, mmap=False):
+    """Read an MRC, TIFF or NPY file, returns the array and its voxel size (None if unknown)"""
+
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext in ('.mrc', '.map', '.mrcs', '.rec'):
+        array, voxel = fsc.open_mrc(path, return_voxel=True, mmap=mmap)
+        return array, float(voxel)
+
+    if ext in ('.tif', '.tiff'):
+        import tifffile
+        return tifffile.imread(path), None
+
+    if ext == '.npy':
+        return np.load(path, mmap_mode='r' if mmap else None), None
+
+    raise ValueError(f"unsupported file type {path}")
+
+def mapped_region(array):
+    """
+    (file, offset, shape, dtype, strides) of the bytes of an np.memmap (or a view of one) in its
+    file, offset being the position of its first element, so the array can be mapped again
+    without copying it (see map_region). None if the array is not a view of a file.
+    """
+
+    mm = getattr(array, '_mmap', None)
+    if mm is None or getattr(array, 'filename', None) is None:
+        return None
+
+    # the mapping starts at the memmap offset rounded down to the allocation granularity
+    import mmap
+    start = array.offset - array.offset % mmap.ALLOCATIONGRANULARITY
+    mapping = np.frombuffer(mm, dtype=np.uint8)
+    offset = start + array.__array_interface__['data'][0] - mapping.__array_interface__['data'][0]
+
+    return (os.fspath(array.filename), int(offset), tuple(array.shape), array.dtype.str, tuple(array.strides))
+
+def map_region(filename, offset, shape, dtype, strides):
+    """Read-only array mapped from a file region of mapped_region"""
+
+    dtype = np.dtype(dtype)
+    if 0 in shape:
+        return np.empty(shape, dtype=dtype)
+
+    # bytes spanned by the array, the strides may be negative
+    low = offset + sum(min(0, (n - 1) * s) for n, s in zip(shape, strides))
+    high = offset + sum(max(0, (n - 1) * s) for n, s in zip(shape, strides)) + dtype.itemsize
+    mapping = np.memmap(filename, dtype=np.uint8, mode='r', offset=low, shape=(high - low,))
+
+    return np.ndarray(shape, dtype=dtype, buffer=mapping, offset=offset - low, strides=strides)
+
+def compute_curve(array, method, n_splits=1, partner=None):
+    """Curve of a 2-D or 3-D array with one of the estimators (method 'sfsc', 'single' or 'fsc')"""
+
+    r = array.shape[0] // 2
+
+    if method == 'fsc':
+        assert partner is not None, "the fsc method needs a second half map"
+        if array.ndim == 2:
+            return fsc.two_image_frc(array, partner, r)
+        return fsc.two_volume_fsc(array, partner, r)
+
+    if method == 'sfsc':
+        if array.ndim == 2:
+            return fsc.get_SFRC_curve__even_odd(array)[1]
+        return fsc.get_SFSC_curve(array)[1]
+
+    if method == 'single':
+        if array.ndim == 2:
+            if n_splits > 2:
+                raise ValueError("single_image_frc only supports n_splits 1 and 2")
+            return np.mean(fsc.single_image_frc(array, r, n_splits=n_splits), axis=0)
+        return np.mean(fsc.single_volume_fsc(array, r, n_splits=n_splits), axis=0)
+
+    raise ValueError(f"unknown method {method}")
+
+def process_file(path, method, n_splits=1, pair=None, voxel=None, thresholds=(1/7,)):
+    """Compute the curve and resolutions of one file, returns a record (dict) for the output"""
+
+    record = {'path': path, 'partner': None, 'method': method, 'status': 'ok', 'error': None}
+
+    try:
+        t = time.perf_counter()
+        array, file_voxel = load_array(path)
+        partner = None
+        if method == 'fsc':
+            record['partner'] = path.replace(*pair)
+            partner, _ = load_array(record['partner'])
+        record['load_seconds'] = time.perf_counter() - t
+
+        voxel = voxel or file_voxel or 1.0
+
+        t = time.perf_counter()
+        curve = compute_curve(np.asarray(array), method, n_splits, None if partner is None else np.asarray(partner))
+        record['compute_seconds'] = time.perf_counter() - t
+
+        mode = 'split' if method == 'single' and n_splits > 1 else 'full'
+        freq = fsc.get_radial_spatial_frequencies(np.asarray(array), voxel, mode=mode)[:len(curve)]
+
+        record['shape'] = 'x'.join(str(n) for n in array.shape)
+        record['voxel'] = voxel
+        # NaN (None in the output) where the curve never crosses v or crosses it at the first shell
+        resolutions = fsc.linear_interp_resolutions(curve, freq, thresholds)[0]
+        for v, resolution in zip(thresholds, resolutions):
+            record[f'resolution_{v:.3f}'] = None if np.isnan(resolution) else float(resolution)
+        record['frequencies'] = [float(f) for f in freq]
+        record['curve'] = [float(c) for c in curve]
+
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = f"{type(e).__name__}: {e}"
+
+    return record
+
+def _init_worker(fft_backend, fft_workers, precision, spectrum_cache=None, spectrum_cache_bytes=None):
+    fsc.set_fft_backend(fft_backend, workers=fft_workers)
+    fsc.set_precision(precision)
+    fsc.set_spectrum_cache(spectrum_cache, spectrum_cache_bytes)
+
+def read_checkpoint(checkpoint):
+    """Records already written to a checkpoint file (the last one of every path wins)"""
+
+    records = {}
+    if os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError: # partially written last line of a crashed run
+                    continue
+                records[record['path']] = record
+
+    return records
+
+def write_output(output, records):
+    """Write the records as a table, one row per file (.csv, or .parquet with pandas)"""
+
+    columns = []
+    for record in records:
+        for k in record:
+            if k not in columns:
+                columns.append(k)
+
+    if output.endswith('.parquet'):
+        import pandas as pd
+        pd.DataFrame(records, columns=columns).to_parquet(output, index=False)
+        return
+
+    with open(output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for record in records:
+            row = dict(record)
+            for k in ('frequencies', 'curve'):
+                if row.get(k) is not None:
+                    row[k] = ' '.join(repr(x) for x in row[k])
+            writer.writerow(row)
+
+def run(inputs, output, method='sfsc', n_splits=1, pair=None, voxel=None, thresholds=(1/7,), jobs=None,
+        fft_backend='numpy', fft_workers=1, precision='double', spectrum_cache=None, spectrum_cache_bytes=None,
+        verbose=True):
+    """Process every file matching the glob patterns in inputs, resuming from <output>.partial.jsonl"""
+
+    paths = sorted(set(p for pattern in inputs for p in glob.glob(pattern)))
+    if method == 'fsc':
+        paths = [p for p in paths if pair[0] in p]
+
+    checkpoint = output + '.partial.jsonl'
+    records = read_checkpoint(checkpoint)
+    todo = [p for p in paths if records.get(p, {}).get('status') != 'ok']
+
+    if verbose:
+        print(f"{len(paths)} files, {len(paths) - len(todo)} already done", file=sys.stderr)
+
+    with open(checkpoint, 'a') as f, \
+         ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(fft_backend, fft_workers, precision, spectrum_cache,
+                                       spectrum_cache_bytes)) as pool:
+        futures = [pool.submit(process_file, p, method, n_splits, pair, voxel, thresholds) for p in todo]
+        for i, future in enumerate(as_completed(futures)):
+            record = future.result()
+            records[record['path']] = record
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+            if verbose:
+                print(f"[{i+1}/{len(todo)}] {record['path']} {record['status']}", file=sys.stderr)
+
+    write_output(output, [records[p] for p in paths if p in records])
+
+    return records
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FSC/SFSC curves and resolutions of many maps (MRC, TIFF or NPY)")
+    parser.add_argument('inputs', nargs='+', help="input files or glob patterns (quote them)")
+    parser.add_argument('-o', '--output', required=True, help="output table (.csv or .parquet)")
+    parser.add_argument('-m', '--method', default='sfsc', choices=['sfsc', 'single', 'fsc'],
+                        help="get_SFSC_curve (sfsc), single_volume_fsc (single) or two_volume_fsc (fsc)")
+    parser.add_argument('--n-splits', type=int, default=1, help="n_splits of single_volume_fsc/single_image_frc")
+    parser.add_argument('--pair', default='half1,half2',
+                        help="for fsc, the second half map is found replacing the first string by the second")
+    parser.add_argument('--voxel', type=float, default=None, help="voxel size (default: from the MRC header, or 1)")
+    parser.add_argument('-t', '--threshold', type=float, action='append', default=None,
+                        help="FSC threshold of the resolution (can be repeated, default 1/7)")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--fft-backend', default='numpy', choices=['numpy', 'scipy', 'pyfftw'])
+    parser.add_argument('--fft-workers', type=int, default=1, help="FFT threads per worker process")
+    parser.add_argument('--precision', default='double', choices=['double', 'single'])
+    parser.add_argument('--spectrum-cache', default=None, help="directory of the on-disk spectrum cache (default: no cache)")
+    parser.add_argument('--spectrum-cache-bytes', type=float, default=None, help="size bound of the spectrum cache")
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    run(args.inputs, args.output, method=args.method, n_splits=args.n_splits, pair=tuple(args.pair.split(',')),
+        voxel=args.voxel, thresholds=tuple(args.threshold or [1/7]), jobs=args.jobs, fft_backend=args.fft_backend,
+        fft_workers=args.fft_workers, precision=args.precision, spectrum_cache=args.spectrum_cache,
+        spectrum_cache_bytes=args.spectrum_cache_bytes, verbose=not args.quiet)
+
+if __name__ == '__main__':
+    main()
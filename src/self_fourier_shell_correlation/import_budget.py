@@ -0,0 +1,55 @@
+"""
+Import-time budget check of fsc_utils, for the short-lived worker processes.
+
+    python -m self_fourier_shell_correlation.import_budget --budget 0.15
+
+The module is imported in a fresh interpreter with -X importtime. The check fails
+if the import takes longer than the budget (in seconds, not counting numpy, which
+every worker needs anyway), or if it loads one of the heavy optional dependencies.
+"""
+
+import sys
+import argparse
+import subprocess
+
+# loaded on first use only (plotting, shuffling estimators, scipy FFT backend, simulation, MRC files)
+HEAVY_MODULES = ('matplotlib', 'scipy', 'shuffling', 'mrcfile', 'pyfftw', 'pandas')
+
+def measure_import(module='self_fourier_shell_correlation.fsc_utils'):
+    """
+    Import module in a fresh interpreter, returns the import time in seconds (without numpy)
+    and the names of the top-level packages it loaded
+    """
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+
+    seconds = (cumulative[module] - cumulative.get('numpy', 0)) / 1e6
+    loaded = sorted(set(name.split('.')[0] for name in cumulative))
+
+    return seconds, loaded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of fsc_utils")
+    parser.add_argument('--budget', type=float, default=0.15, help="seconds, without numpy (default 0.15)")
+    parser.add_argument('--module', default='self_fourier_shell_correlation.fsc_utils')
+    args = parser.parse_args(argv)
+
+    seconds, loaded = measure_import(args.module)
+    heavy = [m for m in HEAVY_MODULES if m in loaded]
+
+    print(f"import {args.module}: {seconds:.3f} s (budget {args.budget:.3f} s)")
+    if heavy:
+        print(f"heavy modules loaded at import: {', '.join(heavy)}")
+
+    return int(seconds > args.budget or bool(heavy))
+
+if __name__ == '__main__':
+    sys.exit(main())
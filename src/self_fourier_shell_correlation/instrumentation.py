@@ -0,0 +1,127 @@
+"""
+Per-stage timing of the estimators (FFT, phase shift, binning, normalization and the
+estimators themselves), recorded only inside a profile_stages() block:
+
+    with profile_stages(trace=True) as record:
+        get_SFSC_curve(volume)
+    print(stage_summary(record))
+    json.dump(stage_trace(record), open('trace.json', 'w'))  # chrome://tracing, Perfetto
+
+Outside profile_stages the instrumented functions only pay one dictionary lookup
+(and nothing is traced by tracemalloc).
+"""
+
+import os
+import time
+import tracemalloc
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+# record of the active profile_stages() block (None when disabled)
+_profile = {'record': None}
+_lock = threading.Lock()
+
+def _enter_memory(record):
+    """Start measuring the peak allocation of a stage (see _exit_memory)"""
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    # bytes in use at the start, peak of the enclosing stage until now, peak of the inner stages
+    record['memory'].append([current, peak, 0])
+
+def _exit_memory(record):
+    """Peak bytes allocated by the stage above what was in use when it started"""
+
+    start, outer_peak, inner_peak = record['memory'].pop()
+    peak = max(tracemalloc.get_traced_memory()[1], inner_peak)
+    if record['memory']: # the peak was reset inside the enclosing stage, pass it on
+        record['memory'][-1][2] = max(record['memory'][-1][2], outer_peak, peak)
+
+    return max(0, peak - start)
+
+def stage(name, category='stage'):
+    """
+    Decorator recording the calls, wall time and peak allocated bytes (tracemalloc, see
+    profile_stages) of a function as the stage name (category 'stage', or 'estimator' for
+    the functions that contain stages)
+    """
+
+    def decorator(function):
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            record = _profile['record']
+            if record is None:
+                return function(*args, **kwargs)
+
+            if record['memory'] is not None:
+                _enter_memory(record)
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                nbytes = _exit_memory(record) if record['memory'] is not None else 0
+
+            with _lock:
+                calls, total, total_bytes, _ = record['stages'].get(name, (0, 0.0, 0, category))
+                record['stages'][name] = (calls + 1, total + seconds, max(total_bytes, nbytes), category)
+                if record['events'] is not None:
+                    record['events'].append({'name': name, 'cat': category, 'ph': 'X',
+                                             'ts': (start - record['start']) * 1e6, 'dur': seconds * 1e6,
+                                             'pid': os.getpid(), 'tid': threading.get_ident(),
+                                             'args': {'peak_bytes': nbytes}})
+            if record['callback'] is not None:
+                record['callback'](name, seconds, nbytes)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+@contextmanager
+def profile_stages(trace=False, callback=None, memory=True):
+    """
+    Record every instrumented stage run inside the block. Yields the record, a dict whose
+    'stages' maps stage names to (calls, seconds, peak bytes, category); with trace=True the
+    'events' are kept as well (see stage_trace). callback(name, seconds, peak bytes) is called
+    after every stage. The peak bytes are the largest allocation (above what was in use when
+    the stage started, measured with tracemalloc) of any call; memory=False skips tracemalloc,
+    which slows down every allocation, and records 0 bytes (with threads, the allocations of
+    the stages running at the same time are mixed).
+    """
+
+    record = {'stages': {}, 'events': [] if trace else None, 'callback': callback, 'start': time.perf_counter(),
+              'memory': [] if memory else None}
+
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+
+    previous = _profile['record']
+    _profile['record'] = record
+    try:
+        yield record
+    finally:
+        _profile['record'] = previous
+        if started:
+            tracemalloc.stop()
+
+def stage_summary(record):
+    """Table of the recorded stages, slowest first (estimator times include their stages)"""
+
+    lines = [f"{'stage':40s} {'category':10s} {'calls':>8s} {'seconds':>10s} {'peak MiB':>10s}"]
+    stages = sorted(record['stages'].items(), key=lambda item: -item[1][1])
+    for name, (calls, seconds, nbytes, category) in stages:
+        lines.append(f"{name:40s} {category:10s} {calls:8d} {seconds:10.4f} {nbytes / 2**20:10.1f}")
+
+    return '\n'.join(lines)
+
+def stage_trace(record):
+    """Recorded events in the Trace Event Format (profile_stages(trace=True)), JSON serializable"""
+
+    assert record['events'] is not None, "profile_stages(trace=True) is needed for the events"
+
+    return {'traceEvents': list(record['events']), 'displayTimeUnit': 'ms'}
@@ -0,0 +1,188 @@
+"""
+MRC files and out-of-core (disk-backed) FSC/SFSC.
+
+Original author: Eric Verbeke.
+Maintainer: Vicente González-Ruiz
+"""
+
+import tempfile
+import numpy as np
+
+from .core import _precision, _fft, _normalize_correlation, half_weights, phase_factors, get_radial_spatial_frequencies
+from .instrumentation import stage
+
+def open_mrc(mrc_file, return_voxel=False, mmap=False):
+    """
+    Read an MRC file (requires mrcfile). With mmap=True the data is returned as a
+    read-only np.memmap of the file (nothing is loaded until it is accessed).
+    """
+    
+    import mrcfile
+    
+    if mmap:
+        with mrcfile.open(mrc_file, header_only=True) as mrc:
+            header = mrc.header
+            voxel = mrc.voxel_size.x
+        dtype = mrcfile.utils.data_dtype_from_header(header)
+        shape = mrcfile.utils.data_shape_from_header(header)
+        offset = header.nbytes + int(header.nsymbt)
+        v = np.memmap(mrc_file, dtype=dtype, mode='r', offset=offset, shape=shape)
+    else:
+        with mrcfile.open(mrc_file) as mrc:
+            v = mrc.data
+            voxel = mrc.voxel_size.x
+    
+    if return_voxel:
+        v = [v, voxel]
+    
+    return v
+
+def save_mrc(mrc_file, array, voxel_size=None):
+    """Write an array to an MRC file (requires mrcfile), float64 is stored as float32"""
+    
+    import mrcfile
+    
+    array = np.asarray(array)
+    if array.dtype == np.float64: # not an MRC mode
+        array = array.astype(np.float32)
+    
+    with mrcfile.new(mrc_file, overwrite=True) as mrc:
+        mrc.set_data(array)
+        if voxel_size is not None:
+            mrc.voxel_size = voxel_size
+
+def _scratch_array(shape, dtype, scratch_dir=None):
+    """Temporary disk-backed array, the file is removed when the array is released"""
+    
+    f = tempfile.TemporaryFile(dir=scratch_dir)
+    
+    return np.memmap(f, dtype=dtype, mode='w+', shape=shape)
+
+def rftn_out_of_core(array, out=None, slab=16, scratch_dir=None):
+    """
+    Same as rftn(array), computed slab by slab for arrays that do not fit in memory
+    (e.g. np.memmap from open_mrc(mmap=True)). First every slab along the first axis
+    is transformed over the remaining axes, then the first axis is transformed in
+    slabs along the second axis. The result is written to out, by default a
+    scratch np.memmap in scratch_dir.
+    """
+    
+    shape = array.shape
+    d = len(shape)
+    half_shape = tuple(shape[:-1]) + (shape[-1]//2 + 1,)
+    
+    if out is None:
+        out = _scratch_array(half_shape, _precision['complex'], scratch_dir)
+    
+    inner_axes = tuple(range(1, d))
+    for start in range(0, shape[0], slab):
+        chunk = np.asarray(array[start:start + slab])
+        out[start:start + slab] = np.fft.fftshift(_fft('rfftn', chunk, axes=inner_axes), axes=inner_axes[:-1])
+    
+    for start in range(0, half_shape[1], slab):
+        chunk = np.asarray(out[:, start:start + slab])
+        out[:, start:start + slab] = np.fft.fftshift(_fft('fft', chunk, axis=0), axes=0)
+    
+    return out
+
+def _slab_shells(shape, start, stop, dr=1):
+    """Shell number and multiplicity of the voxels of rows start:stop of a centered half spectrum"""
+    
+    center = [n//2 for n in shape]
+    idx = [slice(start - center[0], stop - center[0])]
+    idx += [slice(-center[i], shape[i] - center[i]) for i in range(1, len(shape) - 1)]
+    idx += [slice(0, shape[-1]//2 + 1)]
+    coords = np.ogrid[idx]
+    
+    radial_dists = 0
+    for c in coords:
+        radial_dists = radial_dists + c**2
+    labels = np.round(np.sqrt(radial_dists)).astype(np.intp) // dr
+    
+    weights = np.broadcast_to(half_weights(shape[-1]), labels.shape)
+    
+    return labels.ravel(), weights.ravel()
+
+@stage('binning')
+def fourier_shell_sums_out_of_core(Y1, Y2, shape, rmax, shift=None, slab=16):
+    """
+    Per-shell sums of Re(conj(Y1)*Y2), |Y1|**2 and |Y2|**2 and the number of voxels per shell,
+    for centered half spectra (rftn, e.g. from rftn_out_of_core) of real arrays of given shape.
+    Y2 is phase shifted as phase_shift(Y2, shift, shape) would do. Only slab rows are in memory at a time.
+    """
+    
+    t = np.zeros(rmax)
+    b1 = np.zeros(rmax)
+    b2 = np.zeros(rmax)
+    counts = np.zeros(rmax)
+    
+    if shift is not None:
+        factors, conj_factors = phase_factors(shape, shift, half=True)
+    
+    for start in range(0, shape[0], slab):
+        stop = min(start + slab, shape[0])
+        y1 = np.asarray(Y1[start:stop])
+        y2 = np.asarray(Y2[start:stop])
+        
+        if shift is not None:
+            w = factors[0][start:stop]
+            w_conj = conj_factors[0][start:stop]
+            for f, f_conj in zip(factors[1:], conj_factors[1:]):
+                w = w * f
+                w_conj = w_conj * f_conj
+            y2 = y2 * ((w + w_conj) / 2)
+        
+        labels, weights = _slab_shells(shape, start, stop)
+        keep = labels < rmax
+        labels = labels[keep]
+        weights = weights[keep]
+        
+        y1 = y1.ravel()[keep]
+        y2 = y2.ravel()[keep]
+        
+        t += np.bincount(labels, weights=weights * (np.conj(y1) * y2).real, minlength=rmax)
+        b1 += np.bincount(labels, weights=weights * np.abs(y1)**2, minlength=rmax)
+        b2 += np.bincount(labels, weights=weights * np.abs(y2)**2, minlength=rmax)
+        counts += np.bincount(labels, weights=weights, minlength=rmax)
+    
+    return t, b1, b2, counts
+
+@stage('two_volume_fsc_out_of_core', 'estimator')
+def two_volume_fsc_out_of_core(volume_1, volume_2, rmax, slab=16, scratch_dir=None):
+    """Same as two_volume_fsc, for volumes that do not fit in memory (the spectra go to scratch files)"""
+    
+    assert volume_1.shape == volume_2.shape, "input shape mismatch"
+    
+    shape = volume_1.shape
+    
+    Y1 = rftn_out_of_core(volume_1, slab=slab, scratch_dir=scratch_dir)
+    Y2 = rftn_out_of_core(volume_2, slab=slab, scratch_dir=scratch_dir)
+    
+    t, b1, b2, counts = fourier_shell_sums_out_of_core(Y1, Y2, shape, rmax, slab=slab)
+    
+    return _normalize_correlation(t, b1, b2, counts)
+
+@stage('get_SFSC_curve_out_of_core', 'estimator')
+def get_SFSC_curve_out_of_core(volume, slab=16, scratch_dir=None):
+    """Same as get_SFSC_curve, for volumes that do not fit in memory (the spectra go to scratch files)"""
+    
+    y1 = volume
+    splits = [(y1[:, :, ::2], y1[:, :, 1::2], (0, 0, 0.5)),
+              (y1[:, ::2, :], y1[:, 1::2, :], (0, 0.5, 0)),
+              (y1[::2, :, :], y1[1::2, :, :], (0.5, 0, 0))]
+    
+    r = volume.shape[0]//2
+    
+    corrs = []
+    for s_even, s_odd, shift in splits:
+        S_even = rftn_out_of_core(s_even, slab=slab, scratch_dir=scratch_dir)
+        S_odd = rftn_out_of_core(s_odd, slab=slab, scratch_dir=scratch_dir)
+        t, b1, b2, counts = fourier_shell_sums_out_of_core(S_even, S_odd, s_even.shape, r, shift=shift, slab=slab)
+        corrs.append(_normalize_correlation(t, b1, b2, counts))
+        del S_even, S_odd
+    
+    c_avg = np.mean(corrs, axis=0)
+    
+    freq = get_radial_spatial_frequencies(splits[0][0], 1)
+    
+    return freq, c_avg
@@ -0,0 +1,22 @@
+"""
+Plotting of FSC curves (requires matplotlib).
+
+Original author: Eric Verbeke.
+Maintainer: Vicente González-Ruiz
+"""
+
+import matplotlib.pyplot as plt
+
+def plot_fsc(spatial_freq, fsc_values, X_label, Y_label, title, show_thresholds=True):
+    """
+    Plot the Fourier Shell Correlation (FSC) curve.
+    """
+    plt.plot(spatial_freq, fsc_values, label='FSC')
+    if show_thresholds:
+        plt.axhline(y=0.143, color='r', linestyle='--', label='0.143 threshold')
+        plt.axhline(y=0.5, color='g', linestyle='--', label='0.5 threshold')
+    plt.xlabel(X_label)
+    plt.ylabel(Y_label)
+    plt.title(title)
+    plt.legend()
+    plt.show()
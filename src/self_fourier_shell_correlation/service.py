@@ -0,0 +1,349 @@
+"""
+Long-running local FSC service: the imports, shell plans and FFT plans (pyfftw
+wisdom) stay warm between requests, and the concurrent requests of the same
+kind and shape are run as one stack.
+
+    sfsc-serve --socket /tmp/sfsc.sock --warm 128x128
+
+    client = Client('/tmp/sfsc.sock')
+    frc = client.call('two_image_frc', image_1, image_2, rmax=64)
+
+Requests and responses are lines of JSON over a Unix socket (or TCP). The arrays
+go by reference: a block of shared memory ({'shm': name, 'shape', 'dtype'}, see
+shared_array, written in place by the caller, nothing is copied), a region of a
+file ({'file': path, 'offset', 'shape', 'dtype', 'strides'}, e.g. an np.memmap or a
+slice of one, mapped by the service) or a .npy file ({'file': path}, memory-mapped);
+small arrays can also go inline ({'data': list}).
+
+Operations (arrays; parameters):
+    two_image_frc       image_1, image_2; rmax
+    single_image_frc    image; rmax, n_splits
+    two_volume_fsc      volume_1, volume_2; rmax
+    single_volume_fsc   volume; rmax, n_splits
+    resolutions         curves, frequencies[, counts]; criteria, decimals
+    stats               -
+"""
+
+import sys
+import json
+import socket
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import fsc_utils as fsc
+
+# shared memory blocks attached by the service, by name (the most recently used last)
+_blocks = {}
+_MAX_BLOCKS = 64
+# evicted blocks whose buffer is still used by a batch, closed once it is released
+_closing = []
+
+def _close_blocks():
+    """Close the evicted blocks that are no longer used"""
+
+    for block in list(_closing):
+        try:
+            block.close()
+        except BufferError:
+            continue
+        _closing.remove(block)
+
+def _shared_block(name):
+    """Shared memory block of a client, attached once and kept while it is in use"""
+
+    block = _blocks.pop(name, None)
+    if block is None:
+        from multiprocessing import shared_memory
+        block = shared_memory.SharedMemory(name=name)
+        try: # the block belongs to the client, which unlinks it
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(block._name, 'shared_memory')
+        except Exception:
+            pass
+    _blocks[name] = block
+
+    while len(_blocks) > _MAX_BLOCKS:
+        _closing.append(_blocks.pop(next(iter(_blocks))))
+    _close_blocks()
+
+    return block
+
+def _attach(spec):
+    """Array of a request (read-only)"""
+
+    if 'shm' in spec:
+        block = _shared_block(spec['shm'])
+        array = np.ndarray(tuple(spec['shape']), dtype=spec['dtype'], buffer=block.buf, offset=spec.get('offset', 0))
+    elif 'file' in spec and 'offset' in spec:
+        from .fsc_batch import map_region
+        array = map_region(spec['file'], spec['offset'], tuple(spec['shape']), spec['dtype'], tuple(spec['strides']))
+    elif 'file' in spec:
+        array = np.load(spec['file'], mmap_mode='r')
+    else:
+        array = np.array(spec['data'], dtype=spec.get('dtype', np.float64))
+
+    array.flags.writeable = False
+
+    return array
+
+def _rmax(params, shape):
+    return int(params.get('rmax') or shape[0]//2)
+
+def _run_batch(op, params, batch):
+    """Results of a batch of requests (lists of arrays) of the same op, shapes and parameters"""
+
+    if op == 'two_image_frc':
+        A = np.stack([a for a, b in batch])
+        B = np.stack([b for a, b in batch])
+        return list(fsc.two_image_frc_stack(A, B, _rmax(params, A.shape[1:])))
+
+    if op == 'single_image_frc':
+        images = np.stack([image for image, in batch])
+        return list(fsc.single_image_frc_stack(images, _rmax(params, images.shape[1:]), int(params.get('n_splits', 1))))
+
+    if op == 'two_volume_fsc':
+        A = np.stack([a for a, b in batch])
+        B = np.stack([b for a, b in batch])
+        shape = A.shape[1:]
+        axes = (-3, -2, -1)
+        return list(fsc.compute_fourier_shell_correlation_stack(fsc.rftn(A, axes), fsc.rftn(B, axes),
+                                                                _rmax(params, shape), shape))
+
+    if op == 'single_volume_fsc':
+        volumes = np.stack([volume for volume, in batch])
+        return list(fsc.single_volume_fsc_stack(volumes, _rmax(params, volumes.shape[1:]), int(params.get('n_splits', 1))))
+
+    if op == 'resolutions':
+        criteria = params.get('criteria', (1/7, 0.5))
+        decimals = params.get('decimals', 2)
+        return [fsc.linear_interp_resolutions(arrays[0], arrays[1], criteria,
+                                              arrays[2] if len(arrays) > 2 else None, decimals)
+                for arrays in batch]
+
+    raise ValueError(f"unknown operation {op}")
+
+def _batch_key(op, arrays, params):
+    """Requests with the same key are run together"""
+
+    return (op, tuple((a.shape, a.dtype.str) for a in arrays), json.dumps(params, sort_keys=True))
+
+async def serve(path=None, host='127.0.0.1', port=8765, batch_window=0.002, max_batch=256, threads=1, warm=()):
+    """
+    Run the service on the Unix socket path (or host:port), until cancelled. Requests of
+    the same kind, shapes and parameters arriving within batch_window seconds (up to
+    max_batch) run as one batch, in a pool of threads. warm is a list of image or
+    volume shapes whose shell plans and FFTs are prepared at start.
+    """
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=threads)
+    pending = {} # batch key -> [(arrays, future)]
+    stats = {'requests': 0, 'batches': 0, 'errors': 0}
+
+    for shape in warm:
+        x = np.random.default_rng(0).normal(size=shape) # zeros would divide by zero
+        op = 'two_image_frc' if len(shape) == 2 else 'two_volume_fsc'
+        await loop.run_in_executor(executor, _run_batch, op, {}, [(x, x)])
+
+    async def flush(key):
+        batch = pending.pop(key, None)
+        if not batch:
+            return
+        op, _, params = key
+        stats['batches'] += 1
+        try:
+            results = await loop.run_in_executor(executor, _run_batch, op, json.loads(params),
+                                                 [arrays for arrays, _ in batch])
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def submit(op, arrays, params):
+        key = _batch_key(op, arrays, params)
+        future = loop.create_future()
+        if key not in pending:
+            pending[key] = []
+            loop.call_later(batch_window, lambda: asyncio.ensure_future(flush(key)))
+        pending[key].append((arrays, future))
+        if len(pending[key]) >= max_batch:
+            await flush(key)
+        return await future
+
+    async def answer(line):
+        request = {}
+        try:
+            stats['requests'] += 1
+            request = json.loads(line)
+            op = request['op']
+            if op == 'stats':
+                return {'id': request.get('id'), 'result': dict(stats)}
+            arrays = [_attach(spec) for spec in request.get('arrays', [])]
+            result = await submit(op, arrays, request.get('params', {}))
+            return {'id': request.get('id'), 'result': np.asarray(result).tolist()}
+        except Exception as e:
+            stats['errors'] += 1
+            return {'id': request.get('id') if isinstance(request, dict) else None,
+                    'error': f"{type(e).__name__}: {e}"}
+
+    async def handle(reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def reply(line):
+            response = await answer(line)
+            async with lock:
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+
+        # the requests of one connection are answered as they finish (match them by id)
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            task = asyncio.ensure_future(reply(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+
+    if path is not None:
+        server = await asyncio.start_unix_server(handle, path=path, limit=2**26)
+    else:
+        server = await asyncio.start_server(handle, host, port, limit=2**26)
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(wait=False)
+
+def shared_array(shape, dtype=np.float64):
+    """
+    Array in a new block of shared memory, to be filled in place and passed to Client.call
+    without copies. Returns the array and the block (close and unlink it when done).
+    """
+
+    from multiprocessing import shared_memory
+
+    nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    block = shared_memory.SharedMemory(create=True, size=nbytes)
+
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf), block
+
+class Client:
+    """Blocking client of the service (one request at a time per client)"""
+
+    def __init__(self, path=None, host='127.0.0.1', port=8765):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.file = self.socket.makefile('rwb')
+        self.count = 0
+        self.blocks = {} # id of array -> (array, shared memory block)
+
+    def _spec(self, array):
+        if isinstance(array, str):
+            return {'file': array}
+        from .fsc_batch import mapped_region
+        region = mapped_region(array) # an np.memmap, or a view of one
+        if region is not None:
+            filename, offset, shape, dtype, strides = region
+            return {'file': filename, 'offset': offset, 'shape': list(shape), 'dtype': dtype, 'strides': list(strides)}
+        base = array
+        while isinstance(base, np.ndarray) and id(base) not in self.blocks:
+            base = base.base
+        if isinstance(base, np.ndarray) and array.flags.c_contiguous: # a shared array, or a view of it
+            owner, block = self.blocks[id(base)]
+            offset = array.__array_interface__['data'][0] - owner.__array_interface__['data'][0]
+            return {'shm': block.name, 'offset': offset, 'shape': list(array.shape), 'dtype': array.dtype.str}
+        array = np.asarray(array)
+        return {'data': array.tolist(), 'dtype': array.dtype.str}
+
+    def shared_array(self, shape, dtype=np.float64):
+        """Same as shared_array(), the block is released by close()"""
+
+        array, block = shared_array(shape, dtype)
+        self.blocks[id(array)] = (array, block)
+
+        return array
+
+    def _result(self, response):
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        result = response['result']
+        return result if isinstance(result, dict) else np.asarray(result, dtype=np.float64)
+
+    def _send(self, op, arrays, params):
+        self.count += 1
+        request = {'id': self.count, 'op': op, 'arrays': [self._spec(a) for a in arrays], 'params': params}
+        self.file.write((json.dumps(request) + '\n').encode())
+        return self.count
+
+    def call(self, op, *arrays, **params):
+        """Run op on arrays (shared_array()s, memory-mapped .npy, paths of .npy files or small arrays)"""
+
+        self._send(op, arrays, params)
+        self.file.flush()
+
+        return self._result(json.loads(self.file.readline()))
+
+    def map(self, op, arrays, **params):
+        """Run op on every tuple of arrays, all the requests are sent before reading the results (so they can be batched)"""
+
+        ids = [self._send(op, a, params) for a in arrays]
+        self.file.flush()
+
+        responses = {}
+        while len(responses) < len(ids):
+            response = json.loads(self.file.readline())
+            responses[response['id']] = response
+
+        return [self._result(responses[i]) for i in ids]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+        for _, block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local FSC/FRC service")
+    parser.add_argument('--socket', default=None, help="Unix socket path (default: TCP on --host:--port)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--batch-window', type=float, default=0.002, help="seconds to wait for requests to batch")
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--threads', type=int, default=1, help="batches computed at the same time")
+    parser.add_argument('--warm', nargs='*', default=[], help="shapes to prepare at start, e.g. 128x128 64x64x64")
+    parser.add_argument('--fft-backend', default='numpy', choices=['numpy', 'scipy', 'pyfftw'])
+    parser.add_argument('--fft-workers', type=int, default=1, help="FFT threads")
+    parser.add_argument('--wisdom-file', default=None, help="pyfftw wisdom, loaded at start and saved at exit")
+    parser.add_argument('--precision', default='double', choices=['double', 'single'])
+    args = parser.parse_args(argv)
+
+    fsc.set_fft_backend(args.fft_backend, workers=args.fft_workers, wisdom_file=args.wisdom_file)
+    fsc.set_precision(args.precision)
+    warm = [tuple(int(n) for n in s.split('x')) for s in args.warm]
+
+    try:
+        asyncio.run(serve(args.socket, args.host, args.port, args.batch_window, args.max_batch, args.threads, warm))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.wisdom_file and args.fft_backend == 'pyfftw':
+            fsc.save_fft_wisdom()
+
+if __name__ == '__main__':
+    sys.exit(main())
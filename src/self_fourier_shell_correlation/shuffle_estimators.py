@@ -0,0 +1,220 @@
+"""
+SFRC estimators based on pixel shuffling, they require the shuffling package.
+
+Original author: Eric Verbeke.
+Maintainer: Vicente González-Ruiz
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from shuffling import image as image_shuffling
+
+from .core import rft2, two_image_frc, compute_fourier_shell_correlation, get_radial_spatial_frequencies
+from .instrumentation import stage
+
+def __get_SFRC_curve__chessboard(image):
+    '''even/odd downsampling'''
+    blacks = image_shuffling.chessboard_interpolate_blacks(image)
+    whites = image_shuffling.chessboard_interpolate_whites(image)
+
+    r = image.shape[0]//2
+
+    c1 = two_image_frc(image, blacks, r)
+    c2 = two_image_frc(image, whites, r)
+
+    c_avg = np.mean([c1, c2], axis=0)
+
+    c_avg = 2*c_avg / (1 + c_avg)
+
+    freq = get_radial_spatial_frequencies(image, 2)
+
+    return freq, c_avg
+
+@stage('get_SFRC_curve__chessboard', 'estimator')
+def get_SFRC_curve__chessboard(image):
+    blacks = image_shuffling.chessboard_blacks(image)
+    whites = image_shuffling.chessboard_whites(image)
+
+    r = image.shape[0]//2
+
+    c_avg = two_image_frc(whites, blacks, r)
+
+    #c_avg = 8*c_avg / (1 + 7*c_avg)
+
+    freq = get_radial_spatial_frequencies(image, 1)
+
+    return freq, c_avg
+
+@stage('get_SFRC_curve__interpolated_chessboard', 'estimator')
+def get_SFRC_curve__interpolated_chessboard(image):
+    blacks = image_shuffling.chessboard_interpolate_blacks(image)
+    whites = image_shuffling.chessboard_interpolate_whites(image)
+
+    r = image.shape[0]//2
+
+    c_avg = two_image_frc(whites, blacks, r)
+
+    #c_avg = 8*c_avg / (1 + 7*c_avg)
+
+    freq = get_radial_spatial_frequencies(image, 1)
+
+    return freq, c_avg
+
+@stage('get_SFRC_curve__subsampled_chessboard', 'estimator')
+def get_SFRC_curve__subsampled_chessboard(image):
+    # https://www.nature.com/articles/s41467-019-11024-z
+    # https://github.com/sakoho81/miplib/blob/public/miplib/processing/image.py#L133
+
+    A, B, C, D = image_shuffling.subsampled_chessboard(image)
+
+    r = image.shape[0]//4
+
+    c1 = two_image_frc(A, B, r)
+    c2 = two_image_frc(C, D, r)
+    c_avg = np.mean([c1, c2], axis=0)
+
+    # See https://static-content.springer.com/esm/art%3A10.1038%2Fs42003-023-05724-y/MediaObjects/42003_2023_5724_MOESM2_ESM.pdf (Eq. 29)q
+    c_avg = 4*c_avg / (1 + 3*c_avg)
+
+    #freq = get_radial_spatial_frequencies(image, 2)
+    freq = np.arange(0, len(c_avg))/(len(c_avg)*4)
+
+    return freq, c_avg
+
+@stage('get_SFRC_curve__SPRS1', 'estimator')
+def get_SFRC_curve__SPRS1(image, N = 10, std_dev=2.0, sigma_poly=1.2, window_side=5):
+    '''Structure-Preserving Random shuffling'''
+    r = image.shape[0]//2
+
+    acc = np.zeros(r)
+    for i in range(N):
+        c1 = image_shuffling.randomize_and_project(image, std_dev, window_side, sigma_poly)
+        c2 = image_shuffling.randomize_and_project(image, std_dev, window_side, sigma_poly)
+        curve = two_image_frc(c1, c2, r)
+        acc += curve
+
+    c_avg = acc/(i+1)
+    #c_avg = 2*c_avg / (1 + c_avg)
+    freq = get_radial_spatial_frequencies(image, 1)
+
+    return freq, c_avg
+
+@stage('get_SFRC_curve__SPRS', 'estimator')
+def get_SFRC_curve__SPRS(image, N = 10, std_dev=2.5, sigma_poly=1.2, window_side=5, fadding_width=0):
+    '''Structure-Preserving Random shuffling (using always the original image)'''
+
+    r = image.shape[0]//2
+
+    # the spectrum of the original image and its faded version are the same in every iteration
+    Y = rft2(image)
+    faded = image_shuffling.fade_image_margins(image, fadding_width)
+
+    acc = np.zeros(r)
+    for i in range(N):
+        #c1 = image_shuffling.randomize_and_project(image, std_dev, window_side, sigma_poly)
+        c2 = image_shuffling.randomize_and_project(faded, std_dev, window_side, sigma_poly)
+        curve = two_image_frc(Y, rft2(c2), r, shape=image.shape)
+        acc += curve
+
+    c_avg = acc/(i+1)
+    #c_avg = 2*c_avg / (1 + c_avg)
+    freq = get_radial_spatial_frequencies(image, 1)
+
+    return freq, c_avg
+
+MonteCarloCurve = namedtuple('MonteCarloCurve', ['freq', 'curve', 'lower', 'upper', 'iterations'])
+
+# arrays shared by the SPRS iterations of a worker, see _init_sprs
+_sprs_state = {}
+
+def _init_sprs(image, faded, Y, params):
+    _sprs_state.update(image=image, faded=faded, Y=Y, params=params)
+
+def _sprs_iteration(seed):
+    """One SPRS curve, the shuffling RNG (numpy's global one) seeded with seed"""
+
+    image, faded, Y, params = (_sprs_state[k] for k in ('image', 'faded', 'Y', 'params'))
+    std_dev, window_side, sigma_poly, reference = params
+    r = image.shape[0]//2
+
+    state = np.random.get_state()
+    np.random.seed(seed)
+    try:
+        c2 = image_shuffling.randomize_and_project(faded, std_dev, window_side, sigma_poly)
+        if reference == 'shuffled':
+            c1 = image_shuffling.randomize_and_project(faded, std_dev, window_side, sigma_poly)
+            Y1 = rft2(c1)
+        else:
+            Y1 = Y
+    finally:
+        np.random.set_state(state)
+
+    return compute_fourier_shell_correlation(Y1, rft2(c2), r, shape=image.shape)
+
+@stage('get_SFRC_curve__SPRS_monte_carlo', 'estimator')
+def get_SFRC_curve__SPRS_monte_carlo(image, tol=0.01, min_iterations=3, max_iterations=50, std_dev=2.5,
+                                     sigma_poly=1.2, window_side=5, fadding_width=0, reference='original',
+                                     confidence=0.95, seed=None, n_jobs=1, callback=None):
+    """
+    Structure-Preserving Random shuffling with as many iterations as needed: the shuffles run
+    n_jobs at a time (in worker processes if n_jobs > 1), every iteration with its own RNG stream
+    (spawned from seed, so the result does not depend on n_jobs), until the confidence band of the
+    mean curve is narrower than tol (half width, at every frequency) or max_iterations are done.
+    reference='original' correlates with the image itself (its spectrum computed once), as
+    get_SFRC_curve__SPRS, reference='shuffled' with a second shuffle, as get_SFRC_curve__SPRS1.
+    callback(iterations, curve, half_width) is called after every iteration.
+    Returns a MonteCarloCurve (freq, curve, lower, upper, iterations), lower and upper are NaN
+    after a single iteration.
+    """
+
+    from scipy.special import ndtri
+
+    z = ndtri(0.5 + confidence/2)
+    r = image.shape[0]//2
+
+    # get_SFRC_curve__SPRS always fades the margins, get_SFRC_curve__SPRS1 never
+    faded = image_shuffling.fade_image_margins(image, fadding_width) if reference == 'original' or fadding_width else image
+    initargs = (image, faded, rft2(image), (std_dev, window_side, sigma_poly, reference))
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(max_iterations)]
+
+    # running mean and sum of squared deviations (Welford)
+    k = 0
+    mean = np.zeros(r)
+    m2 = np.zeros(r)
+    half_width = np.full(r, np.inf)
+
+    pool = ProcessPoolExecutor(n_jobs, initializer=_init_sprs, initargs=initargs) if n_jobs > 1 else None
+    if pool is None:
+        _init_sprs(*initargs)
+
+    try:
+        converged = False
+        while k < max_iterations and not converged:
+            round_seeds = seeds[k:k + max(n_jobs, min_iterations - k)]
+            curves = pool.map(_sprs_iteration, round_seeds) if pool else map(_sprs_iteration, round_seeds)
+            # the curves are taken in seed order and the tolerance tested after each one, so the
+            # iterations do not depend on n_jobs (the curves of the round past the stop are dropped)
+            for curve in curves:
+                k += 1
+                delta = curve - mean
+                mean += delta / k
+                m2 += delta * (curve - mean)
+
+                if k > 1:
+                    half_width = z * np.sqrt(m2 / (k - 1) / k)
+                if callback is not None:
+                    callback(k, mean.copy(), half_width)
+                if k >= min_iterations and np.nanmax(half_width) <= tol:
+                    converged = True
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if k < 2: # no spread to estimate the band from
+        half_width = np.full(r, np.nan)
+
+    freq = get_radial_spatial_frequencies(image, 1)
+
+    return MonteCarloCurve(freq, mean, mean - half_width, mean + half_width, k)
@@ -0,0 +1,187 @@
+"""
+Simulation of noisy data (B-factor decay, white or colored Gaussian noise) and filters.
+
+Original author: Eric Verbeke.
+Maintainer: Vicente González-Ruiz
+"""
+
+from functools import lru_cache
+import numpy as np
+
+from .core import _precision, _fft, ftn, iftn, radial_distance_grid, sphere_mask, get_radial_spatial_frequencies
+
+def low_pass_filter(array, voxel_size, resolution):
+    """Low pass filter array to specified resolution"""
+
+    n = array.shape[0]
+
+    assert resolution >= ((n - 2) / (2*n*voxel_size))**-1, "specified resolution greater than Nyquist"
+    
+    freq = get_radial_spatial_frequencies(array, voxel_size)  
+    res = np.array([1/f if f > 0 else 0 for f in freq])
+    radius = np.where(res <= resolution)[0][1]
+
+    r_dists = radial_distance_grid(array.shape)
+    lpf_mask = sphere_mask(r_dists, radius)
+    
+    F = ftn(array)
+    F_lpf = F * lpf_mask
+    f_lpf = iftn(F_lpf)
+    
+    return f_lpf
+
+@lru_cache(maxsize=32)
+def _b_factor_kernels(shape, voxel_size, B, dtype, half):
+    
+    d = len(shape)
+    
+    kernels = []
+    for axis, n in enumerate(shape):
+        if half and axis == d - 1:
+            f = np.fft.rfftfreq(n, voxel_size)
+        else:
+            f = np.fft.fftfreq(n, voxel_size)
+        g = np.exp(- f.astype(dtype)**2 * (B/4)).astype(dtype)
+        view = [1]*d
+        view[axis] = g.size
+        g = g.reshape(view)
+        g.flags.writeable = False
+        kernels.append(g)
+    
+    return tuple(kernels)
+
+def get_b_factor_kernels(shape, voxel_size, B, half=True):
+    """
+    B factor decay exp(-B f^2/4) as separable factors, one broadcastable array per axis, for the
+    (not centered) np.fft.rfftn spectrum of an array of given shape (np.fft.fftn if half=False).
+    Cached per (shape, voxel_size, B) and precision.
+    """
+    
+    return _b_factor_kernels(tuple(int(n) for n in shape), float(voxel_size), float(B),
+                             np.dtype(_precision['real']), bool(half))
+
+def _apply_kernels(F, *kernels):
+    """Multiply in place a spectrum by the product of some sets of separable kernels"""
+    
+    for factors in kernels:
+        for g in factors:
+            F *= g
+    
+    return F
+
+def b_factor_function(shape, voxel_size, B):
+    """B factor equation as function of spatial frequency"""
+    
+    real = _precision['real']
+    d = len(shape)
+    
+    square_sf_grid = 0 # broadcast by dimension
+    for axis, n in enumerate(shape):
+        spatial_frequency = np.fft.fftshift(np.fft.fftfreq(n, voxel_size)).astype(real)
+        view = [1]*d
+        view[axis] = n
+        square_sf_grid = square_sf_grid + (spatial_frequency**2).reshape(view)
+    
+    G = np.exp(- square_sf_grid * (B/4))
+    
+    return G
+
+def zero_order_bessel(frequency, shift, pixel_size, mode='full'):
+    """scale zero order Bessel function of the first kind to match FRC, shift is 2D vector"""
+    
+    from scipy.special import jv
+    
+    if mode == 'split':
+        scale = 2*pixel_size*2*np.pi*np.linalg.norm(shift) 
+    else:
+        scale = pixel_size*2*np.pi*np.linalg.norm(shift)
+    
+    B = jv(0, scale*frequency) # J0(pixel_size*2pi*||a||*xi)
+    
+    return B
+
+def get_sigma_for_snr(x, snr):
+    """return standard deviation of WGN for desired snr given real array x"""
+    
+    N = x.size
+    signal = np.sum(x**2)
+    noise = np.sqrt(signal / (snr * N))
+    
+    return noise
+
+def apply_b_factor(v, voxel, B_signal):
+    """return array after applying B-factor decay, input is real array"""
+    
+    V = _fft('rfftn', v)
+    Vb = _apply_kernels(V, get_b_factor_kernels(v.shape, voxel, B_signal))
+    vb = _fft('irfftn', Vb, s=v.shape)
+    
+    return vb
+
+def generate_noise(noise_std, shape, voxel, B_noise=False):
+    """Generate white or color Gaussian noise with B-factor decay"""
+    
+    eps = np.random.normal(0, noise_std, shape)
+    
+    if B_noise:
+        eta = _apply_kernels(_fft('rfftn', eps), get_b_factor_kernels(shape, voxel, B_noise))
+        eps = _fft('irfftn', eta, s=shape)
+        
+    return eps
+
+def generate_noisy_data(v, voxel, snr, B_signal=False, B_noise=False, return_noise=False):
+    """Function to generate noisy data with B-factor decay and color Gaussian noise"""
+    
+    noise_std = get_sigma_for_snr(v, snr) # sigma is computed for array prior to adding B-factor
+    
+    eps = generate_noise(noise_std, v.shape, voxel, B_noise)
+    
+    if B_signal:
+        v = apply_b_factor(v, voxel, B_signal)
+    
+    y = v + eps
+    
+    if return_noise:
+        return y, eps
+    else:
+        return y
+
+def noisy_data_batches(v, voxel, snrs, B_signals=(False,), B_noises=(False,), n_realizations=1, batch_size=None,
+                       seed=None, return_noise=False):
+    """
+    Generator of noisy realizations of v over a grid of SNRs and B factors, same model as
+    generate_noisy_data. The spectrum of v, the decayed signal of every B_signal and the
+    B-factor kernels are computed once; the noise of a batch is colored with one forward and
+    one inverse FFT. Yields (snr, B_signal, B_noise, y) for every batch of at most batch_size
+    (default all) of the n_realizations of every grid point, y being (batch, *v.shape), plus
+    the noise (same shape) if return_noise. The noise comes from np.random.default_rng(seed).
+    """
+    
+    rng = np.random.default_rng(seed)
+    shape = v.shape
+    axes = tuple(range(-len(shape), 0))
+    batch_size = batch_size or n_realizations
+    
+    V = _fft('rfftn', v)
+    
+    for B_signal in B_signals:
+        vb = _fft('irfftn', _apply_kernels(V.copy(), get_b_factor_kernels(shape, voxel, B_signal)), s=shape) if B_signal else v
+        
+        for B_noise in B_noises:
+            kernels = get_b_factor_kernels(shape, voxel, B_noise) if B_noise else ()
+            
+            for snr in snrs:
+                noise_std = get_sigma_for_snr(v, snr) # sigma is computed for array prior to adding B-factor
+                
+                for start in range(0, n_realizations, batch_size):
+                    n = min(batch_size, n_realizations - start)
+                    eps = rng.normal(0, noise_std, (n,) + shape).astype(_precision['real'], copy=False)
+                    if B_noise:
+                        eps = _fft('irfftn', _apply_kernels(_fft('rfftn', eps, axes=axes), kernels), s=shape, axes=axes)
+                    
+                    y = vb + eps
+                    
+                    if return_noise:
+                        yield snr, B_signal, B_noise, y, eps
+                    else:
+                        yield snr, B_signal, B_noise, y
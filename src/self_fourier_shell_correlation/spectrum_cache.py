@@ -0,0 +1,150 @@
+"""
+Optional on-disk cache of spectra, keyed by a hash of the content of the input array
+and the transform parameters, so the analyses repeated on the same maps (other rmax,
+thresholds or split modes) skip the FFTs:
+
+    set_spectrum_cache('/scratch/spectra', max_bytes=32*2**30)
+    two_volume_fsc(half_1, half_2, 128)  # transforms and stores both spectra
+    two_volume_fsc(half_1, half_2, 200)  # reads them back (memory-mapped)
+
+Every spectrum is a .npy file, returned as a read-only np.memmap. When the files
+exceed max_bytes, the least recently used are removed.
+"""
+
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+# cache directory (None disables the cache) and its size bound, see set_spectrum_cache()
+_spectrum_cache = {'directory': None, 'max_bytes': 8 * 2**30}
+
+def set_spectrum_cache(directory=None, max_bytes=None):
+    """Enable the spectrum cache in directory (None disables it), bounded to max_bytes"""
+
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    _spectrum_cache['directory'] = directory
+
+    if max_bytes is not None:
+        _spectrum_cache['max_bytes'] = int(max_bytes)
+
+def get_spectrum_cache():
+    """Return the cache directory (None if disabled) and its size bound in bytes"""
+
+    return _spectrum_cache['directory'], _spectrum_cache['max_bytes']
+
+def clear_spectrum_cache():
+    """Remove every cached spectrum"""
+
+    for path, _, _ in _cache_files():
+        _remove(path)
+
+def array_digest(array, slab_bytes=2**26):
+    """Hash of the shape, dtype and content of an array, read in slabs (also for np.memmap)"""
+
+    h = hashlib.blake2b(digest_size=20)
+    h.update(repr((array.shape, np.dtype(array.dtype).str)).encode())
+
+    if array.ndim == 0 or array.shape[0] == 0:
+        h.update(np.ascontiguousarray(array).tobytes())
+        return h.hexdigest()
+
+    rows = max(1, slab_bytes // max(1, array[0].nbytes))
+    for start in range(0, array.shape[0], rows):
+        h.update(memoryview(np.ascontiguousarray(array[start:start + rows])).cast('B'))
+
+    return h.hexdigest()
+
+def cached_spectra(array, params, compute, digest=None):
+    """
+    Spectra compute() (a list of arrays) of array for the transform params (a string),
+    read from the cache if they were stored before, else computed and stored.
+    Without a cache directory, just compute().
+    """
+
+    directory = _spectrum_cache['directory']
+    if directory is None:
+        return compute()
+
+    digest = digest or array_digest(array)
+    key = hashlib.blake2b(f"{digest}/{params}".encode(), digest_size=20).hexdigest()
+
+    spectra = _load(directory, key)
+    if spectra is None:
+        spectra = compute()
+        _store(directory, key, spectra)
+        _evict(_spectrum_cache['max_bytes'])
+
+    return spectra
+
+def _load(directory, key):
+    """Spectra of key, None if any of them is missing"""
+
+    count = os.path.join(directory, f"{key}.count")
+    try:
+        with open(count) as f:
+            n = int(f.read())
+        spectra = []
+        for i in range(n):
+            path = os.path.join(directory, f"{key}-{i}.npy")
+            spectra.append(np.load(path, mmap_mode='r'))
+            os.utime(path) # most recently used
+        os.utime(count)
+    except (OSError, ValueError): # evicted, or being written by another process
+        return None
+
+    return spectra
+
+def _store(directory, key, spectra):
+    """Write the spectra of key, every file atomically"""
+
+    for i, spectrum in enumerate(spectra):
+        _write(os.path.join(directory, f"{key}-{i}.npy"), lambda f: np.save(f, spectrum))
+    _write(os.path.join(directory, f"{key}.count"), lambda f: f.write(str(len(spectra)).encode()))
+
+def _write(path, write):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        _remove(tmp)
+        raise
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _cache_files():
+    """(path, bytes, last use) of the cached files"""
+
+    directory = _spectrum_cache['directory']
+    if directory is None:
+        return []
+
+    files = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(('.npy', '.count')):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((entry.path, stat.st_size, stat.st_mtime))
+
+    return files
+
+def _evict(max_bytes):
+    """Remove the least recently used files until the cache fits in max_bytes"""
+
+    files = _cache_files()
+    total = sum(size for _, size, _ in files)
+
+    for path, size, _ in sorted(files, key=lambda f: f[2]):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
@@ -0,0 +1,225 @@
+"""
+SFSC/FSC curves of time series of volumes (tomograms), computed in chunks of
+time points by a pool of workers within a memory budget:
+
+    curves = series_curves(sorted(glob.glob('run1/*.mrc')), memory_budget=64*2**30)
+    curves.shape        # (T, rmax), nothing computed yet
+    c = curves.compute()
+
+Every task loads its chunk of volumes (memory-mapped), splits and transforms them
+and bins the shells in the same worker, so no spectrum ever leaves the worker.
+The scheduler is a local process pool ('processes'), a thread pool ('threads'),
+the calling thread ('sync') or dask ('dask'): then the result is a dask array
+computed by the current dask client, so running on a multi-node cluster only
+needs a dask.distributed client connected to it (and the workers started with
+a 'memory' resource to enforce the per-task budget).
+"""
+
+import os
+import numpy as np
+
+from . import fsc_utils as fsc
+from .core import _precision
+
+# peak memory of a task per byte of (real, in the working precision) volume, see _task_bytes
+_PEAK_FACTOR = {'sfsc': 5, 'single': 4}
+
+def _volume_shape(source):
+    """Shape of a time point (a file name, a file region, or an array)"""
+
+    if isinstance(source, str):
+        from .fsc_batch import load_array
+        return load_array(source, mmap=True)[0].shape
+    if isinstance(source, tuple):
+        return source[2]
+
+    return source.shape
+
+def _sources(volumes):
+    """
+    Time points of volumes; the frames of a (T, ...) np.memmap go to the workers as file regions
+    (see mapped_region), so they are read there instead of being copied into every task
+    """
+
+    from .fsc_batch import mapped_region
+
+    if getattr(volumes, 'filename', None) is not None:
+        regions = [mapped_region(volumes[t]) for t in range(len(volumes))]
+        if None not in regions:
+            return regions
+
+    return list(volumes)
+
+def _frequencies(shape, voxel_size, split):
+    """Same as get_radial_spatial_frequencies of an array of given shape, without creating it"""
+
+    if split: # the shape of a sub-array of get_split_array
+        shape = [n//2 - n//2 % 2 for n in shape]
+        voxel_size = 2*voxel_size
+
+    r = max(shape)
+
+    return np.fft.fftfreq(r, voxel_size)[:r//2]
+
+def _curve_length(shape, method, n_splits):
+
+    r = shape[0]//2
+    if method == 'single' and n_splits == 3:
+        return r//2
+
+    return r
+
+def _task_bytes(shape, chunk_size, method):
+    """Estimated peak memory of a task of chunk_size volumes"""
+
+    return int(_PEAK_FACTOR[method] * chunk_size * np.prod(shape) * np.dtype(_precision['real']).itemsize)
+
+def _load(source):
+
+    if isinstance(source, str):
+        from .fsc_batch import load_array
+        source = load_array(source, mmap=True)[0]
+    elif isinstance(source, tuple):
+        from .fsc_batch import map_region
+        source = map_region(*source)
+
+    return np.asarray(source, dtype=_precision['real'])
+
+def _series_task(sources, method, n_splits, length):
+    """Curves (len(sources), length) of a chunk of time points, NaN padded"""
+
+    curves = np.full((len(sources), length), np.nan)
+
+    if method == 'sfsc' and len(sources) > 1:
+        c = fsc.get_SFSC_curve_stack(np.stack([_load(s) for s in sources]))[1]
+        curves[:, :c.shape[1]] = c[:, :length]
+        return curves
+
+    for i, source in enumerate(sources):
+        volume = _load(source)
+        if method == 'sfsc':
+            c = fsc.get_SFSC_curve(volume)[1]
+        else:
+            c = np.mean(fsc.single_volume_fsc(volume, volume.shape[0]//2, n_splits=n_splits), axis=0)
+        curves[i, :min(c.size, length)] = c[:length]
+
+    return curves
+
+def _dask_task(settings, *task):
+    """_series_task on a dask worker, with the FFT, precision and cache settings of the client"""
+
+    from .fsc_batch import _init_worker
+    _init_worker(*settings)
+
+    return _series_task(*task)
+
+def _worker_settings():
+    backend, workers = fsc.get_fft_backend()
+    directory, max_bytes = fsc.get_spectrum_cache()
+    return (backend, workers, fsc.get_precision(), directory, max_bytes)
+
+class LazyCurves:
+    """
+    (T, rmax) curves of a time series, computed on the first compute() (or np.asarray)
+    by the local scheduler, then kept
+    """
+
+    def __init__(self, tasks, shape, freq, scheduler, n_workers, settings):
+        self.tasks = tasks
+        self.shape = shape
+        self.freq = freq
+        self.scheduler = scheduler
+        self.n_workers = n_workers
+        self.settings = settings
+        self._curves = None
+
+    def compute(self, callback=None):
+        """Run the tasks, callback(done, total) is called after every chunk"""
+
+        if self._curves is not None:
+            return self._curves
+
+        curves = np.empty(self.shape)
+        starts = np.cumsum([0] + [len(task[0]) for task in self.tasks])
+
+        if self.scheduler == 'sync':
+            results = map(lambda task: _series_task(*task), self.tasks)
+            for i, c in enumerate(results):
+                curves[starts[i]:starts[i + 1]] = c
+                if callback is not None:
+                    callback(i + 1, len(self.tasks))
+        else:
+            from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+            from .fsc_batch import _init_worker
+            if self.scheduler == 'threads':
+                pool = ThreadPoolExecutor(max_workers=self.n_workers)
+            else:
+                pool = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_worker, initargs=self.settings)
+            with pool:
+                futures = {pool.submit(_series_task, *task): i for i, task in enumerate(self.tasks)}
+                for done, future in enumerate(as_completed(futures)):
+                    i = futures[future]
+                    curves[starts[i]:starts[i + 1]] = future.result()
+                    if callback is not None:
+                        callback(done + 1, len(self.tasks))
+
+        self._curves = curves
+
+        return curves
+
+    def __array__(self, dtype=None, copy=None):
+        curves = self.compute()
+        return curves if dtype is None else curves.astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        state = 'computed' if self._curves is not None else f"{len(self.tasks)} tasks"
+        return f"LazyCurves(shape={self.shape}, scheduler={self.scheduler!r}, {state})"
+
+def series_curves(volumes, method='sfsc', n_splits=1, voxel_size=1, scheduler='processes', workers=None,
+                  memory_budget=None, chunk_size=1):
+    """
+    Lazily evaluated (T, rmax) curves of a time series: volumes is a list of files (MRC,
+    TIFF or NPY, memory-mapped when possible) or arrays, or a (T, d, h, w) array or np.memmap
+    (whose frames are read by the workers from its file).
+    method is 'sfsc' (get_SFSC_curve, chunks of volumes run as one stack) or 'single'
+    (single_volume_fsc with n_splits, averaged over the splits). The time points are grouped
+    in tasks of chunk_size volumes; at most memory_budget bytes (estimated) are in use at a time,
+    which bounds the workers (default: one per core) of the local schedulers.
+    Returns a LazyCurves (its freq, in 1/voxel_size, are the frequencies of the curves),
+    or a dask array with scheduler='dask'.
+    """
+
+    assert method in _PEAK_FACTOR, f"unknown method {method}"
+
+    sources = _sources(volumes)
+    T = len(sources)
+    shape = _volume_shape(sources[0])
+    length = _curve_length(shape, method, n_splits)
+
+    tasks = [(sources[i:i + chunk_size], method, n_splits, length) for i in range(0, T, chunk_size)]
+
+    freq = _frequencies(shape, voxel_size, method == 'single' and n_splits > 1)[:length]
+
+    task_bytes = _task_bytes(shape, chunk_size, method)
+    n_workers = workers or os.cpu_count()
+    if memory_budget is not None:
+        assert task_bytes <= memory_budget, f"a task needs about {task_bytes} bytes, over the memory budget"
+        n_workers = max(1, min(n_workers, int(memory_budget // task_bytes)))
+
+    if scheduler == 'dask':
+        import dask
+        import dask.array as da
+        blocks = []
+        settings = _worker_settings()
+        with dask.annotate(resources={'memory': task_bytes}):
+            for task in tasks:
+                block = dask.delayed(_dask_task, pure=True)(settings, *task)
+                blocks.append(da.from_delayed(block, shape=(len(task[0]), length), dtype=np.float64))
+        return da.concatenate(blocks)
+
+    assert scheduler in ('processes', 'threads', 'sync'), f"unknown scheduler {scheduler}"
+
+    return LazyCurves(tasks, (T, length), freq, scheduler, n_workers, _worker_settings())
@@ -0,0 +1,60 @@
+import json
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from self_fourier_shell_correlation import fsc_utils as fsc
+from self_fourier_shell_correlation.service import serve, Client
+
+@pytest.fixture
+def client(tmp_path):
+    path = str(tmp_path / 'sfsc.sock')
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    async def run():
+        task = asyncio.ensure_future(serve(path))
+        while not (tmp_path / 'sfsc.sock').exists():
+            await asyncio.sleep(0.01)
+        started.set()
+        await task
+
+    def main():
+        try:
+            loop.run_until_complete(run())
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=main, daemon=True)
+    thread.start()
+    assert started.wait(10)
+
+    client = Client(path)
+    yield client
+    client.close()
+    for task in asyncio.all_tasks(loop):
+        loop.call_soon_threadsafe(task.cancel)
+    thread.join(10)
+
+def test_memmap_round_trip(client, tmp_path):
+    rng = np.random.default_rng(0)
+    images = rng.normal(size=(4, 32, 32))
+    np.save(tmp_path / 'images.npy', images)
+    mapped = np.load(tmp_path / 'images.npy', mmap_mode='r')
+
+    for image in (mapped[1], mapped[2:4][1], mapped[0, ::-1]):
+        spec = client._spec(image)
+        assert 'data' not in spec and spec['file'] == str(tmp_path / 'images.npy')
+        frc = client.call('single_image_frc', image, rmax=16)
+        assert np.allclose(frc, fsc.single_image_frc(np.asarray(image), 16))
+
+def test_malformed_request(client):
+    client.file.write(b'{not json\n')
+    client.file.flush()
+    response = json.loads(client.file.readline())
+    assert 'error' in response
+
+    volume = np.random.default_rng(1).normal(size=(16, 16, 16))
+    assert np.allclose(client.call('single_volume_fsc', volume, rmax=8), fsc.single_volume_fsc(volume, 8))